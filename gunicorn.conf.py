@@ -0,0 +1,17 @@
+# gunicorn reads this file from the working directory, so app.yaml's "gunicorn -b :$PORT main:app" picks it up.
+# /plot is mostly waiting on the upstream API (the socket read releases the GIL), so each worker runs enough
+# threads to keep several upstream requests in flight while others do their pandas/numpy work.
+# Every worker loads its own pandas/plotly and keeps its own SimpleCache, so stay at a small fixed count that fits the
+# smaller App Engine instance classes; raise GUNICORN_WORKERS on bigger instances.
+import os
+
+workers = int(os.environ.get("GUNICORN_WORKERS", 2))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+timeout = 30
+
+# Each worker runs its own prefetch thread (with a shared cache, each site is still refreshed by only one of them);
+# start it here rather than at import so that importing main (tests, flask shell, scripts) doesn't spawn one.
+def post_worker_init(worker):
+    from main import start_prefetch
+    start_prefetch()
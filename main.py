@@ -1,15 +1,99 @@
 import os
+import orjson
 import requests
-import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import numpy as np
 from datetime import datetime
-from sklearn.ensemble import IsolationForest
-from flask import Flask, request, render_template_string
-import plotly.graph_objects as go
+from collections import OrderedDict
+from itertools import zip_longest
+import functools
+from flask import Flask, request, make_response
+from flask_caching import Cache
+from flask_compress import Compress
+import threading
+import time
 import traceback
 
 app = Flask(__name__)
 
+# The page inlines the whole Plotly figure as JSON, which compresses very well; prefer Brotli, fall back to gzip.
+app.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+Compress(app)
+
+# Rendered pages are cached per (site_id, end_date); end_date rolls over daily, so entries go stale on their own.
+# Set CACHE_TYPE=RedisCache (and CACHE_REDIS_URL) to share the cache between gunicorn workers.
+CACHE_TIMEOUT = 3600
+cache = Cache(app, config={
+    "CACHE_TYPE": os.environ.get("CACHE_TYPE", "SimpleCache"),
+    "CACHE_REDIS_URL": os.environ.get("CACHE_REDIS_URL"),
+    "CACHE_DEFAULT_TIMEOUT": CACHE_TIMEOUT,
+})
+
+# Background prefetch: when a worker starts and then every PREFETCH_INTERVAL seconds (0 disables), re-render the
+# sites listed in PREFETCH_SITE_IDS plus the ones that rendered successfully within the last PREFETCH_IDLE_TIMEOUT
+# seconds, so /plot is normally a cache hit. Keep the interval below CACHE_TIMEOUT. The thread is started per worker
+# by gunicorn.conf.py; with a shared cache the workers split the refreshes between them (see _claim_prefetch).
+PREFETCH_INTERVAL = int(os.environ.get("PREFETCH_INTERVAL", 50 * 60))
+PREFETCH_IDLE_TIMEOUT = 24 * 3600
+PREFETCH_MAX_SITES = 100
+PREFETCH_SITE_IDS = tuple(sid.strip() for sid in os.environ.get("PREFETCH_SITE_IDS", "").split(",") if sid.strip())
+_prefetch_site_ids = OrderedDict() # site_id -> time.monotonic() of its last successful request
+_prefetch_lock = threading.Lock()
+_prefetch_thread = None
+_prefetch_state = threading.local()
+
+def _prefetch_active():
+    return getattr(_prefetch_state, "active", False)
+
+# One pooled session per worker so upstream calls reuse keep-alive TLS connections. requests' default Accept-Encoding
+# already asks for gzip/deflate, plus br and zstd since Flask-Compress pulls those decoders in.
+# Connection failures and 502/503/504 responses are retried on the same pool, with the short backoff only: a 503's
+# Retry-After is ignored, since honouring it could park a worker thread for minutes. urllib3 counts a dropped keep-alive
+# connection (RemoteDisconnected / reset) as a read error, so one read retry is allowed for the stale-pool case; the
+# 15 s read timeout keeps a stalled upstream to about 2 x 15 s. The connect timeout sits just past the 3 s TCP retransmit.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=Retry(total=2, read=1, backoff_factor=0.2, status_forcelist=(502, 503, 504), respect_retry_after_header=False)))
+
+# Plotly.js only understands expanded template objects; resolve "plotly_white" once instead of per figure.
+# plotly is imported inside this and _plotly_js_url on first use, not at module import (see the pandas import below).
+@functools.lru_cache(maxsize=None)
+def _plotly_white_template():
+    import plotly.io as pio
+    return pio.templates["plotly_white"].to_plotly_json()
+
+# Load the Plotly.js release bundled with the installed plotly package (pinned in requirements.txt, so it matches the
+# template above) instead of the unpinned plotly-latest, using the "basic" partial bundle (scatter/bar/pie).
+@functools.lru_cache(maxsize=None)
+def _plotly_js_url():
+    from plotly.offline import get_plotlyjs_version
+    return f"https://cdn.plot.ly/plotly-basic-{get_plotlyjs_version()}.min.js"
+
+# orjson can't encode pandas Timestamps (datetime subclasses); send them as ISO strings.
+def _json_default(obj):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError
+
+# Serialize with orjson, escaping <, >, & and ' like Jinja's |tojson so the result is safe inside <script>.
+def _to_script_json(obj):
+    raw = orjson.dumps(obj, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return raw.replace(b"<", b"\\u003c").replace(b">", b"\\u003e").replace(b"&", b"\\u0026").replace(b"'", b"\\u0027").decode()
+
+# Background season lines are downsampled to about this many points; flagged markers are always sent in full.
+LINE_MAX_POINTS = 2000
+
+# Indices of the first/last point plus the min and max of each bucket, so spikes survive downsampling.
+# (Min/max bucketing is fully vectorized; unlike LTTB it never drops a local extreme.)
+def _minmax_downsample_idx(y, n_out):
+    if y.size <= n_out:
+        return np.arange(y.size)
+    bucket = -(-y.size // (n_out // 2))
+    n_buckets = -(-y.size // bucket)
+    blocks = np.pad(y, (0, n_buckets * bucket - y.size), mode='edge').reshape(n_buckets, bucket)
+    offsets = np.arange(n_buckets) * bucket
+    return np.unique(np.concatenate(([0, y.size - 1], offsets + blocks.argmin(axis=1), offsets + blocks.argmax(axis=1))))
+
 # (HTML_TEMPLATE remains the same)
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -17,7 +101,7 @@ HTML_TEMPLATE = """
 <head>
     <meta charset="UTF-8">
     <title>Discharge Flags for Site {{ site_id }}</title>
-    <script src="https://cdn.plot.ly/plotly-latest.min.js"></script>
+    {% if plot_json %}<script src="{{ plotly_js_url() }}"></script>{% endif %}
     <style>
         body { font-family: sans-serif; margin: 20px; }
         h2 { color: #333; }
@@ -45,7 +129,7 @@ HTML_TEMPLATE = """
     {% endif %}
 
     <script>
-        var plot_json = {{ plot_json | default('null') | tojson | safe }};
+        var plot_json = {{ (plot_json or 'null') | safe }};
         if (plot_json) {
             try {
                 Plotly.newPlot('plot', plot_json.data, plot_json.layout, {responsive: true});
@@ -59,108 +143,160 @@ HTML_TEMPLATE = """
 </html>
 """
 
+# Compiled once at import; render_template_string would re-lex and re-parse the template on every call.
+PLOT_TEMPLATE = app.jinja_env.from_string(HTML_TEMPLATE, globals={"plotly_js_url": _plotly_js_url})
+
 @app.route('/plot')
 def plot_site():
     site_id = request.args.get("id")
+
+    if not site_id:
+        error_message = "Missing 'id' parameter in query string."
+        return PLOT_TEMPLATE.render(error=error_message, site_id="N/A"), 400
+
+    end_date = datetime.today().strftime("%Y-%m-%d")
+    html, status = _render_plot_html(site_id, end_date)
+    response = make_response(html, status)
+    if status == 200:
+        _remember_site_id(site_id)
+        # Let browsers/CDNs reuse the page for as long as we cache it, and revalidate with If-None-Match after that.
+        response.headers["Cache-Control"] = f"public, max-age={CACHE_TIMEOUT}"
+        response.add_etag()
+        response.make_conditional(request)
+    return response
+
+
+def _is_site_payload(data):
+    return isinstance(data, dict) and isinstance(data.get("data"), list)
+
+# The raw upstream payload is cached on its own as well, so a page whose render failed (and so wasn't cached)
+# doesn't refetch it. Request errors raise and are never cached, and neither is a 200 with the wrong shape
+# (e.g. {"error": "busy"}), so the next request asks upstream again.
+@cache.memoize(timeout=CACHE_TIMEOUT, response_filter=_is_site_payload, forced_update=_prefetch_active)
+def _fetch_site_json(site_id, end_date):
+    api_url = f"https://www.waterrights.utah.gov/dvrtdb/daily-chart.asp?station_id={site_id}&end_date={end_date}&f=json"
+    print(f"Fetching data for site {site_id}: {api_url}")
+    response = SESSION.get(api_url, timeout=(3.05, 15))
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+
+# Only successful renders are cached, so fetch/processing failures are retried on the next request.
+# The prefetch thread forces a re-render; a failed refresh leaves the previously cached page in place.
+@cache.memoize(timeout=CACHE_TIMEOUT, response_filter=lambda rv: rv[1] == 200, forced_update=_prefetch_active)
+def _render_plot_html(site_id, end_date):
     plot_json = None
     error_message = None
     warning_message = None
     nodata_message = None
 
-    if not site_id:
-        error_message = "Missing 'id' parameter in query string."
-        return render_template_string(HTML_TEMPLATE, error=error_message, site_id="N/A"), 400
-
     # --- Data Fetching ---
-    # (Error handling for fetch remains the same)
+    # Only network/HTTP errors and undecodable bodies (orjson raises a ValueError) are expected here.
     try:
-        end_date = datetime.today().strftime("%Y-%m-%d")
-        api_url = f"https://www.waterrights.utah.gov/dvrtdb/daily-chart.asp?station_id={site_id}&end_date={end_date}&f=json"
-        print(f"Fetching data for site {site_id}: {api_url}")
-        response = requests.get(api_url, timeout=30)
-        response.raise_for_status()
-        data = response.json()
-        if "data" not in data or not isinstance(data["data"], list):
-             error_message = f"API response 'data' field invalid or missing for site {site_id}."
-             return render_template_string(HTML_TEMPLATE, error=error_message, site_id=site_id), 502
-    except Exception as e: # Catch all fetch errors here
-        # (Consolidated error handling for fetch)
-        tb_str = traceback.format_exc(); print(tb_str)
+        data = _fetch_site_json(site_id, end_date)
+    except (requests.RequestException, ValueError) as e:
+        print(traceback.format_exc())
         error_message = f"Error fetching data: {str(e)}"
-        return render_template_string(HTML_TEMPLATE, error=error_message, site_id=site_id), 500
+        return PLOT_TEMPLATE.render(error=error_message, site_id=site_id), 500
+    if not _is_site_payload(data):
+        error_message = f"API response 'data' field invalid or missing for site {site_id}."
+        return PLOT_TEMPLATE.render(error=error_message, site_id=site_id), 502
 
 
     # --- Data Processing & Plotting ---
     try:
+        # pandas (like plotly above) is imported on first use, so worker boot, error pages and cache hits don't load it.
+        # The trade-off: the first render on each worker pays the pandas/plotly import instead of boot.
+        import pandas as pd
+
         if not data["data"]:
             nodata_message = f"No time series data returned from API for site {site_id}."
-            return render_template_string(HTML_TEMPLATE, nodata=nodata_message, site_id=site_id), 200
-        else:
-            df = pd.DataFrame(data["data"], columns=["date", "value"])
-            df.rename(columns={"date": "Date", "value": "DISCHARGE"}, inplace=True)
+            return PLOT_TEMPLATE.render(nodata=nodata_message, site_id=site_id), 200
 
-        df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-        df['DISCHARGE'] = pd.to_numeric(df['DISCHARGE'], errors='coerce')
-        df = df.dropna(subset=['Date', 'DISCHARGE']).sort_values(by='Date').reset_index(drop=True)
+        # Split the [date, value] rows straight into two typed arrays, drop unparseable rows and sort by date
+        # with numpy; the DataFrame is only built from the final clean columns. zip_longest pads short rows with None
+        # (dropped below as NaT/NaN) and any extra columns are ignored.
+        columns = list(zip_longest(*data["data"]))
+        raw_dates = columns[0]
+        raw_values = columns[1] if len(columns) > 1 else [None] * len(raw_dates)
+        dates = pd.to_datetime(raw_dates, errors='coerce', format='ISO8601').to_numpy() # pinned format: no per-call inference
+        values = np.asarray(pd.to_numeric(raw_values, errors='coerce'), dtype=np.float64)
+        valid = ~np.isnat(dates) & ~np.isnan(values)
+        dates, values = dates[valid], values[valid]
+        order = np.argsort(dates, kind='stable')
+        df = pd.DataFrame({'Date': dates[order], 'DISCHARGE': values[order]})
 
         if df.empty:
             nodata_message = f"No valid, plottable data points found for site {site_id} after cleaning."
-            return render_template_string(HTML_TEMPLATE, nodata=nodata_message, site_id=site_id), 200
+            return PLOT_TEMPLATE.render(nodata=nodata_message, site_id=site_id), 200
 
-        metadata_fields = ["station_id", "station_name", "system_name", "units"]
-        metadata = {field: data.get(field, f"N/A") for field in metadata_fields}
-        station_name = metadata.get('station_name', f'Station {site_id}')
-        units = metadata.get('units', 'Unknown Units')
+        station_name = data.get('station_name') or f'Station {site_id}'
+        units = data.get('units') or 'Unknown Units'
 
-        # 1. Define Seasons and Segment Data (unchanged)
+        # 1. Define Seasons and Segment Data (one vectorized month test instead of per-row lambdas)
         irrigation_months = [4, 5, 6, 7, 8, 9]
-        df['Season'] = df['Date'].dt.month.apply(lambda month: 'Irrigation' if month in irrigation_months else 'Non-Irrigation')
-        df['Discharge_Irrigation'] = df.apply(lambda row: row['DISCHARGE'] if row['Season'] == 'Irrigation' else np.nan, axis=1)
-        df['Discharge_NonIrrigation'] = df.apply(lambda row: row['DISCHARGE'] if row['Season'] == 'Non-Irrigation' else np.nan, axis=1)
-
-        # 2. Flagging Criteria (logic unchanged, condensed for brevity)
-        # ... (full flagging logic as before) ...
-        df['FLAG_NEGATIVE'] = (df['DISCHARGE'] < 0) & (df['DISCHARGE'].notna()) & (df['DISCHARGE'] != 0)
-        df['FLAG_ZERO'] = (df['DISCHARGE'] == 0) & (df['DISCHARGE'].notna())
-        non_zero_discharge = df[(df['DISCHARGE'].notna()) & (df['DISCHARGE'] != 0)]['DISCHARGE']
-        if not non_zero_discharge.empty:
-            discharge_95th_percentile = np.percentile(non_zero_discharge, 95)
-            df['FLAG_Discharge'] = (df['DISCHARGE'] > discharge_95th_percentile) & (df['DISCHARGE'].notna()) & (df['DISCHARGE'] != 0)
-            Q1, Q3 = non_zero_discharge.quantile([0.25, 0.75]); IQR = Q3 - Q1
-            if IQR > 0: lower_bound, upper_bound = Q1 - 1.5 * IQR, Q3 + 1.5 * IQR; df['FLAG_IQR'] = ((df['DISCHARGE'] < lower_bound) | (df['DISCHARGE'] > upper_bound)) & (df['DISCHARGE'].notna()) & (df['DISCHARGE'] != 0)
-            else: df['FLAG_IQR'] = (df['DISCHARGE'] != Q1) & (df['DISCHARGE'].notna()) & (df['DISCHARGE'] != 0)
-            df['RATE_OF_CHANGE'] = df['DISCHARGE'].diff().abs()
-            if 'discharge_95th_percentile' in locals(): df['FLAG_RoC'] = (df['RATE_OF_CHANGE'] > discharge_95th_percentile) & (df['DISCHARGE'].notna()) & (df['DISCHARGE'] != 0) & (df['RATE_OF_CHANGE'].notna())
-            else: df['FLAG_RoC'] = False
-            non_zero_mask = df['DISCHARGE'].notna() & (df['DISCHARGE'] != 0); df['FLAG_REPEATED'] = False
-            if non_zero_mask.any(): groups = (df.loc[non_zero_mask, 'DISCHARGE'] != df.loc[non_zero_mask, 'DISCHARGE'].shift()).cumsum(); group_sizes = df.loc[non_zero_mask, 'DISCHARGE'].groupby(groups).transform('size'); df.loc[non_zero_mask, 'FLAG_REPEATED'] = (group_sizes >= 3)
-            df_clean = df[(df['DISCHARGE'].notna()) & (df['DISCHARGE'] != 0)].copy()
-            if not df_clean.empty and df_clean['DISCHARGE'].nunique() > 1: model = IsolationForest(contamination='auto', random_state=42); df_clean['OUTLIER_IF_PREDICT'] = model.fit_predict(df_clean[['DISCHARGE']]); df['OUTLIER_IF'] = False; df.loc[df_clean.index, 'OUTLIER_IF'] = (df_clean['OUTLIER_IF_PREDICT'] == -1)
-            else: df['OUTLIER_IF'] = False
-            mean_discharge = non_zero_discharge.mean()
-            if mean_discharge != 0: df['PERCENT_DEV'] = ((df['DISCHARGE'] - mean_discharge).abs() / mean_discharge) * 100; threshold = 1000; df['FLAG_RSD'] = (df['PERCENT_DEV'] > threshold) & (df['DISCHARGE'].notna()) & (df['DISCHARGE'] != 0) & (df['PERCENT_DEV'].notna())
-            else: df['PERCENT_DEV'] = np.nan; df['FLAG_RSD'] = False
-        else: [df.update({f: False}) for f in ['FLAG_Discharge', 'FLAG_IQR', 'FLAG_RoC', 'FLAG_REPEATED', 'OUTLIER_IF', 'FLAG_RSD']]
-        flag_cols_to_check = ['FLAG_NEGATIVE', 'FLAG_ZERO', 'FLAG_REPEATED', 'FLAG_IQR', 'OUTLIER_IF', 'FLAG_Discharge', 'FLAG_RoC', 'FLAG_RSD']; [df.update({col: False}) for col in flag_cols_to_check if col not in df.columns]; df['FLAGGED'] = df[flag_cols_to_check].any(axis=1)
+        is_irrigation = df['Date'].dt.month.isin(irrigation_months).to_numpy()
+        discharge = df['DISCHARGE'].to_numpy()
+        df['Discharge_Irrigation'] = np.where(is_irrigation, discharge, np.nan)
+        df['Discharge_NonIrrigation'] = np.where(is_irrigation, np.nan, discharge)
+
+        # 2. Flagging Criteria (logic unchanged; masks built once on the raw numpy column)
+        # Daily discharge fits comfortably in float32, which halves the bytes every flag pass touches.
+        # The float64 column is kept for the plotted values so the JSON doesn't carry float32 rounding noise.
+        vals = df['DISCHARGE'].to_numpy(dtype=np.float32)
+        nz = (vals != 0) & ~np.isnan(vals)
+        nz_vals = vals[nz]
+        no_flags = np.zeros(vals.size, dtype=bool) # shared all-False mask for flags a branch can't evaluate
+        flags = {}
+        flags['FLAG_NEGATIVE'] = (vals < 0) & nz
+        flags['FLAG_ZERO'] = vals == 0
+        if nz_vals.size:
+            Q1, Q3, discharge_95th_percentile = np.quantile(nz_vals, [0.25, 0.75, 0.95]); IQR = Q3 - Q1
+            flags['FLAG_Discharge'] = (vals > discharge_95th_percentile) & nz
+            if IQR > 0: lower_bound, upper_bound = Q1 - 1.5 * IQR, Q3 + 1.5 * IQR; flags['FLAG_IQR'] = ((vals < lower_bound) | (vals > upper_bound)) & nz
+            else: flags['FLAG_IQR'] = (vals != Q1) & nz
+            # Subtract and abs into one preallocated buffer; the first point has no predecessor and stays NaN (never flagged).
+            rate_of_change = np.empty_like(vals); rate_of_change[0] = np.nan
+            np.subtract(vals[1:], vals[:-1], out=rate_of_change[1:]); np.abs(rate_of_change, out=rate_of_change)
+            flags['FLAG_RoC'] = (rate_of_change > discharge_95th_percentile) & nz
+            # Run-length pass over the non-zero values: label each run, count it with bincount, scatter back.
+            run_starts = np.empty(nz_vals.size, dtype=bool); run_starts[0] = True; run_starts[1:] = nz_vals[1:] != nz_vals[:-1]
+            run_id = np.cumsum(run_starts) - 1
+            flag_repeated = np.zeros(vals.size, dtype=bool); flag_repeated[nz] = np.bincount(run_id)[run_id] >= 3; flags['FLAG_REPEATED'] = flag_repeated
+            # Robust z-score (median/MAD) replaces the 1-D IsolationForest, which only caught the same extreme values at far higher cost.
+            median_discharge = np.median(nz_vals); mad = np.median(np.abs(nz_vals - median_discharge)) * 1.4826
+            if mad > 0: flags['OUTLIER_IF'] = (np.abs(vals - median_discharge) > 3.5 * mad) & nz
+            else: flags['OUTLIER_IF'] = no_flags
+            mean_discharge = nz_vals.mean()
+            if mean_discharge != 0: percent_dev = (np.abs(vals - mean_discharge) / mean_discharge) * 100; threshold = 1000; flags['FLAG_RSD'] = (percent_dev > threshold) & nz
+            else: flags['FLAG_RSD'] = no_flags
+        else:
+            flags.update(dict.fromkeys(['FLAG_Discharge', 'FLAG_IQR', 'FLAG_RoC', 'FLAG_REPEATED', 'OUTLIER_IF', 'FLAG_RSD'], no_flags))
+        # Every branch above sets all eight flags as bool arrays; the marker loop reads them straight from the dict.
 
         # 3. Create Plot and Add Traces (unchanged)
         plot_title = f"Flagged Data Points & Discharge by Season for {station_name}"
-        flag_colors = { 'FLAG_NEGATIVE': ('red', 'Negative (-)'), 'FLAG_ZERO': ('blue', 'Value = 0'), 'FLAG_REPEATED': ('green', 'Repeated (≥3)'), 'FLAG_RoC': ('brown', 'RoC Outlier'), 'FLAG_IQR': ('orange', 'IQR Outlier'), 'OUTLIER_IF': ('teal', 'IF Outlier'), 'FLAG_Discharge': ('purple', '> 95th Perc.'), 'FLAG_RSD': ('magenta', 'RSD Outlier') }
-        fig = go.Figure()
+        flag_colors = { 'FLAG_NEGATIVE': ('red', 'Negative (-)'), 'FLAG_ZERO': ('blue', 'Value = 0'), 'FLAG_REPEATED': ('green', 'Repeated (≥3)'), 'FLAG_RoC': ('brown', 'RoC Outlier'), 'FLAG_IQR': ('orange', 'IQR Outlier'), 'OUTLIER_IF': ('teal', 'MAD Outlier'), 'FLAG_Discharge': ('purple', '> 95th Perc.'), 'FLAG_RSD': ('magenta', 'RSD Outlier') }
+        # Traces are plain dicts: Plotly.js takes them as-is, and skipping go.Scatter avoids per-field validation.
+        traces = []
         line_width = 2.0
-        fig.add_trace(go.Scatter( x=df['Date'].tolist(), y=df['Discharge_Irrigation'].tolist(), mode='lines', line=dict(color='lightgreen', width=line_width), name='Irrigation Season Discharge', connectgaps=False, showlegend=True ))
-        fig.add_trace(go.Scatter( x=df['Date'].tolist(), y=df['Discharge_NonIrrigation'].tolist(), mode='lines', line=dict(color='gray', width=line_width), name='Non-Irrigation Season Discharge', connectgaps=False, showlegend=True ))
+        # x values go out as epoch milliseconds (plain JSON ints) rather than ISO date strings. Trace arrays stay numpy
+        # arrays: orjson serializes them directly (NaN as null), with no per-element Python list in between.
+        dates_ms = df['Date'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+        line_idx = _minmax_downsample_idx(df['DISCHARGE'].to_numpy(), LINE_MAX_POINTS)
+        traces.append(dict(type='scatter', x=dates_ms[line_idx], y=df['Discharge_Irrigation'].to_numpy()[line_idx], mode='lines', line=dict(color='lightgreen', width=line_width), name='Irrigation Season Discharge', connectgaps=False, showlegend=True ))
+        traces.append(dict(type='scatter', x=dates_ms[line_idx], y=df['Discharge_NonIrrigation'].to_numpy()[line_idx], mode='lines', line=dict(color='gray', width=line_width), name='Non-Irrigation Season Discharge', connectgaps=False, showlegend=True ))
         irrigation_marker_traces = []; non_irrigation_marker_traces = []; can_plot_seasons = True
-        irrigation_season_data = df[df['Season'] == 'Irrigation'].copy(); non_irrigation_season_data = df[df['Season'] == 'Non-Irrigation'].copy()
+        # Marker traces only need dates and values: gather each trace with integer indices from the flag masks.
+        is_non_irrigation = ~is_irrigation
         for flag, (color, legend_name) in flag_colors.items():
-            if flag in irrigation_season_data.columns: # Irrigation
-                subset = irrigation_season_data[irrigation_season_data[flag].fillna(False).astype(bool)];
-                if not subset.empty: irrigation_marker_traces.append(go.Scatter( x=subset['Date'].tolist(), y=subset['DISCHARGE'].tolist(), mode='markers', marker=dict(color=color, size=7), name=legend_name, legendgroup=flag, showlegend=True, visible=True ))
-            if flag in non_irrigation_season_data.columns: # Non-Irrigation
-                subset = non_irrigation_season_data[non_irrigation_season_data[flag].fillna(False).astype(bool)];
-                if not subset.empty: non_irrigation_marker_traces.append(go.Scatter( x=subset['Date'].tolist(), y=subset['DISCHARGE'].tolist(), mode='markers', marker=dict(color=color, size=7), name=legend_name, legendgroup=flag, showlegend=True, visible=False ))
-        for trace in irrigation_marker_traces: fig.add_trace(trace)
-        for trace in non_irrigation_marker_traces: fig.add_trace(trace)
+            flag_mask = flags[flag]
+            idx = np.flatnonzero(flag_mask & is_irrigation) # Irrigation
+            if idx.size: irrigation_marker_traces.append(dict(type='scatter', x=dates_ms[idx], y=discharge[idx], mode='markers', marker=dict(color=color, size=7), name=legend_name, legendgroup=flag, showlegend=True, visible=True ))
+            idx = np.flatnonzero(flag_mask & is_non_irrigation) # Non-Irrigation
+            if idx.size: non_irrigation_marker_traces.append(dict(type='scatter', x=dates_ms[idx], y=discharge[idx], mode='markers', marker=dict(color=color, size=7), name=legend_name, legendgroup=flag, showlegend=True, visible=False ))
+        traces.extend(irrigation_marker_traces)
+        traces.extend(non_irrigation_marker_traces)
 
         # 4. Define Button Logic (unchanged)
         num_irr_markers = len(irrigation_marker_traces); num_nonirr_markers = len(non_irrigation_marker_traces); num_total_traces = 2 + num_irr_markers + num_nonirr_markers
@@ -217,12 +353,13 @@ def plot_site():
             y_range = [final_y_min, final_y_max]
 
 
-        # 6. Update Figure Layout <-- Apply custom axis ticks here
-        fig.update_layout(
+        # 6. Build Figure Layout <-- Apply custom axis ticks here
+        layout = dict(
             title=dict(text=plot_title, x=0.5, y=0.98, font=dict(size=20)),
-            yaxis=dict(title=f"Mean Daily Discharge ({units})", title_font=dict(size=18), tickfont=dict(size=14), range=y_range),
+            yaxis=dict(title=dict(text=f"Mean Daily Discharge ({units})", font=dict(size=18)), tickfont=dict(size=14), range=y_range),
             xaxis=dict(
-                title="Date", title_font=dict(size=18), tickfont=dict(size=14),
+                type='date',           # Trace x values are epoch milliseconds
+                title=dict(text="Date", font=dict(size=18)), tickfont=dict(size=14),
                 range=x_range,         # Keep overall fixed range
                 # ***** START: Custom Tick Configuration *****
                 tickmode='array',      # Use explicit tick values/text
@@ -232,21 +369,66 @@ def plot_site():
             ),
             legend=dict( orientation="v", yanchor="top", y=1, xanchor="left", x=1.02, title=dict(text="Flagging Criteria:", font=dict(size=16)), font=dict(size=12), tracegroupgap=5 ),
             updatemenus=[ dict( type="buttons", direction="left", buttons=[irrigation_button, non_irrigation_button, all_seasons_button], showactive=True, x=0.01, xanchor="left", y=1.05, yanchor="bottom" ) ] if can_plot_seasons and (irrigation_marker_traces or non_irrigation_marker_traces) else [],
-            template="plotly_white", margin=dict(t=100, r=250), width=1500, height=800 )
+            template=_plotly_white_template(), margin=dict(t=100, r=250), width=1500, height=800 )
 
         # 7. Convert to JSON
-        plot_json = fig.to_dict()
+        plot_json = _to_script_json(dict(data=traces, layout=layout))
 
     except Exception as e:
-        tb_str = traceback.format_exc(); print(tb_str)
+        print(traceback.format_exc())
         error_message = f"An error occurred during data processing or plot generation: {str(e)}"
 
     # --- Rendering ---
-    return render_template_string(HTML_TEMPLATE, plot_json=plot_json, site_id=site_id, error=error_message, warning=warning_message, nodata=nodata_message)
+    status = 500 if error_message else 200
+    return PLOT_TEMPLATE.render(plot_json=plot_json, site_id=site_id, error=error_message, warning=warning_message, nodata=nodata_message), status
+
+# --- Background prefetch ---
+def _remember_site_id(site_id):
+    with _prefetch_lock:
+        _prefetch_site_ids[site_id] = time.monotonic()
+        _prefetch_site_ids.move_to_end(site_id)
+        while len(_prefetch_site_ids) > PREFETCH_MAX_SITES:
+            _prefetch_site_ids.popitem(last=False)
+
+def _recent_site_ids():
+    # Entries are in request order, so the idle ones are all at the front.
+    cutoff = time.monotonic() - PREFETCH_IDLE_TIMEOUT
+    with _prefetch_lock:
+        while _prefetch_site_ids and next(iter(_prefetch_site_ids.values())) < cutoff:
+            _prefetch_site_ids.popitem(last=False)
+        return list(_prefetch_site_ids)
+
+# With a shared cache (RedisCache) every worker runs this loop over the same sites; cache.add is an atomic
+# set-if-absent there, so only the first worker to claim a site refreshes it each interval. SimpleCache is per
+# process, so every worker claims and warms its own copy, which is what it needs.
+def _claim_prefetch(site_id, end_date):
+    return cache.add(f"prefetch-claim:{site_id}:{end_date}", True, timeout=max(1, PREFETCH_INTERVAL * 9 // 10))
+
+def _prefetch_loop():
+    # The first pass runs straight away so PREFETCH_SITE_IDS are warm as soon as the worker starts.
+    _prefetch_state.active = True
+    while True:
+        end_date = datetime.today().strftime("%Y-%m-%d")
+        for site_id in OrderedDict.fromkeys(PREFETCH_SITE_IDS + tuple(_recent_site_ids())):
+            try:
+                with app.app_context():
+                    if _claim_prefetch(site_id, end_date):
+                        _render_plot_html(site_id, end_date)
+            except Exception:
+                print(traceback.format_exc())
+        time.sleep(PREFETCH_INTERVAL)
+
+# Called from gunicorn's post_worker_init hook and the dev server below; starts at most one thread per process.
+def start_prefetch():
+    global _prefetch_thread
+    if PREFETCH_INTERVAL > 0 and _prefetch_thread is None:
+        _prefetch_thread = threading.Thread(target=_prefetch_loop, name="plot-prefetch", daemon=True)
+        _prefetch_thread.start()
 
 # --- Main execution block ---
 if __name__ == '__main__':
     print("Starting Flask development server...")
     print(f"Access the plot via http://localhost:8080/plot?id=YOUR_SITE_ID (e.g., http://localhost:8080/plot?id=10987)")
     port = int(os.environ.get("PORT", 8080))
-    app.run(debug=True, host='0.0.0.0', port=port)
+    start_prefetch()
+    app.run(host='0.0.0.0', port=port) # Local development only (set FLASK_DEBUG=1 for the reloader); production runs under gunicorn